@@ -1,19 +1,27 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.responses import FileResponse, StreamingResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from starlette.types import ASGIApp, Receive, Scope, Send
+import msgspec
+import orjson
+import xlsxwriter
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as pa_feather
+import anyio
 import os
+import re
+import tempfile
 from pathlib import Path
-from io import BytesIO
 from datetime import datetime
-from typing import Optional, Dict, Any, List
-from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple, Mapping, Union
+from functools import lru_cache, partial
 
-
-app = FastAPI(title="Accessories Sales Dashboard", version="1.0.0")
+app = FastAPI(title="Accessories Sales Dashboard", version="1.0.0", default_response_class=ORJSONResponse)
 
 # -------------------- CORS --------------------
 app.add_middleware(
@@ -24,26 +32,75 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# -------------------- COMPRESSION --------------------
+class SelectiveGZipMiddleware(GZipMiddleware):
+    # GZipMiddleware, except for paths that serve already-compressed files
+    def __init__(self, app: ASGIApp, skip_paths: Tuple[str, ...] = (), **kwargs: Any) -> None:
+        super().__init__(app, **kwargs)
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# JSON/CSV payloads repeat the same strings a lot; small responses are left alone,
+# and xlsx is already a zip, so recompressing it would only cost CPU
+app.add_middleware(SelectiveGZipMiddleware, skip_paths=("/api/export-excel",), minimum_size=1024, compresslevel=5)
+
 # -------------------- PATHS --------------------
 BASE_DIR = Path(__file__).resolve().parent
 TEMPLATES_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
+DATA_CACHE = BASE_DIR / "Accessories.cleaned.feather"   # cleaned copy of the CSV, rebuilt when the CSV changes
+# stamped into the cache's schema metadata; bump whenever clean_csv changes what it produces
+# (parsing, dtypes, category order, row order) so caches written by older code are rebuilt
+CLEAN_VERSION = "2"
 
 if STATIC_DIR.exists():
     app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 
 # -------------------- REQUEST MODEL --------------------
-class FilterRequest(BaseModel):
+# msgspec decodes and validates the body in one C pass, skipping pydantic model construction
+class FilterRequest(msgspec.Struct, omit_defaults=True):
     quarter: Optional[str] = ""
     month: Optional[str] = ""
     location: Optional[str] = ""
     model: Optional[str] = ""
 
 
+_filter_decoder = msgspec.json.Decoder(FilterRequest)
+
+# the body is read by a dependency, so FastAPI can't see it: describe it for /docs by hand
+# (the struct has no nested types, so its schema can be inlined without $refs)
+FILTER_REQUEST_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": msgspec.json.schema_components([FilterRequest])[1]["FilterRequest"],
+            },
+        },
+    },
+}
+
+
+async def filter_request(request: Request) -> FilterRequest:
+    try:
+        return _filter_decoder.decode(await request.body())
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
 # -------------------- HELPERS --------------------
+_WS_RE = re.compile(r"\s+")
+
+
 def _clean_col_name(c: str) -> str:
-    return " ".join(str(c).replace("\t", " ").strip().split())
+    return _WS_RE.sub(" ", str(c)).strip()
 
 
 # If your CSV headers have extra spaces, this normalization will fix it
@@ -71,6 +128,10 @@ NUMERIC_COLS = [
     "Acc Revenue (MRP) / RO",
 ]
 
+# whole-number counts, stored as int32 (exact, half the width of the default int64/float64);
+# amounts stay float64 so rupee values and their sums print exactly as in the CSV
+COUNT_COLS = ["No of Billied Ros", "No of Counter ROs"]
+
 TABLE_COLS = [
     "Fiscal Quarter", "Fiscal Month", "Location", "Model Group",
     "No of Billied Ros",
@@ -83,13 +144,85 @@ TABLE_COLS = [
     "Acc Revenue (MRP) / RO",
 ]
 
+# rows formatted per CSV export chunk
+CSV_CHUNK_ROWS = 10000
+# Excel exports larger than this spill from memory to a temp file
+EXCEL_SPOOL_BYTES = 8 * 1024 * 1024
+
+# filtered results at least this large sum their totals with the numba kernel
+NUMBA_MIN_ROWS = 100_000
+
 INDIAN_FINANCIAL_MONTHS = ['Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec', 'Jan', 'Feb', 'Mar']
 
+# positions of numeric columns within TABLE_COLS
+NUMERIC_COL_IDX = frozenset(j for j, c in enumerate(TABLE_COLS) if c in NUMERIC_COLS)
+
+# -------------------- EXCEL STYLES --------------------
+# format properties, registered once per workbook and shared by every cell
+BORDER = {"border": 1, "border_color": "#D1D5DB"}
+DATA_FORMAT = {**BORDER}
+HEADER_FORMAT = {**BORDER, "bold": True, "font_color": "#FFFFFF", "bg_color": "#4F46E5", "align": "center", "valign": "vcenter"}
+TOTALS_FORMAT = {**BORDER, "bold": True, "bg_color": "#E0E7FF", "align": "left"}
+TOTALS_NUMERIC_FORMAT = {**TOTALS_FORMAT, "align": "right"}
+
+
 df = pd.DataFrame()
 quarters: List[str] = []
 months: List[str] = []
 locations: List[str] = []
 models: List[str] = []
+filter_options_json = b""
+key_index = pd.MultiIndex.from_arrays([[]] * len(REQUIRED_COLS), names=REQUIRED_COLS)
+total_all: Dict[str, Any] = {}
+cube = pd.DataFrame()
+num_arr = np.empty((0, len(NUMERIC_COLS)))
+
+
+def clean_csv(csv_path: str) -> pd.DataFrame:
+    print("Loading Accessories.csv from:", csv_path)
+
+    # clean headers up front (header row only) so the parser can be told which columns to keep
+    header = pd.read_csv(csv_path, nrows=0).columns
+    names = {c: CANON_RENAME.get(_clean_col_name(c), _clean_col_name(c)) for c in header}
+
+    # required columns check
+    for r in REQUIRED_COLS:
+        if r not in names.values():
+            raise ValueError(f"Missing required column in CSV: {r}")
+
+    # CSV load (multithreaded pyarrow parser), only the columns the app uses
+    wanted = set(REQUIRED_COLS) | set(NUMERIC_COLS)
+    _df = pd.read_csv(
+        csv_path,
+        engine="pyarrow",
+        usecols=[c for c, n in names.items() if n in wanted],
+        dtype={c: "string" for c, n in names.items() if n in REQUIRED_COLS},
+    )
+    _df.columns = [names[c] for c in _df.columns]
+
+    # strip string columns, stored as categoricals so filtering compares int codes;
+    # blank cells become "" (a plain str cast would turn them into "None")
+    for c in REQUIRED_COLS:
+        _df[c] = _df[c].str.strip().fillna("").astype(object).astype("category")
+
+    # numeric columns: pyarrow already typed the plain ones; amounts written
+    # with thousands separators ("6,367.58") still arrive as text
+    for c in NUMERIC_COLS:
+        if c not in _df.columns:
+            continue
+        if not pd.api.types.is_numeric_dtype(_df[c]):
+            _df[c] = pd.to_numeric(_df[c].str.replace(",", "", regex=False), errors="coerce")
+        _df[c] = _df[c].fillna(0)
+        if c in COUNT_COLS:
+            _df[c] = _df[c].astype(np.int32)
+
+    # months in fiscal order, then sort rows by the filter key so the key index is lexsorted
+    _df["Fiscal Month"] = _df["Fiscal Month"].cat.reorder_categories(
+        sorted(_df["Fiscal Month"].cat.categories, key=lambda x: INDIAN_FINANCIAL_MONTHS.index(x) if x in INDIAN_FINANCIAL_MONTHS else 999)
+    )
+    _df = _df.sort_values(REQUIRED_COLS, kind="stable").reset_index(drop=True)
+
+    return _df
 
 
 def load_csv() -> pd.DataFrame:
@@ -115,46 +248,68 @@ def load_csv() -> pd.DataFrame:
             print(" -", p)
         return pd.DataFrame()
 
-    print("Loading Accessories.csv from:", csv_path)
-
-    # CSV load
-    _df = pd.read_csv(csv_path, low_memory=False)
-
-    # clean headers
-    _df.columns = [_clean_col_name(c) for c in _df.columns]
-
-    # rename by canonical map
-    rename_map = {}
-    for c in _df.columns:
-        cc = _clean_col_name(c)
-        rename_map[c] = CANON_RENAME.get(cc, cc)
-    _df = _df.rename(columns=rename_map)
-
-    # required columns check
-    for r in REQUIRED_COLS:
-        if r not in _df.columns:
-            raise ValueError(f"Missing required column in CSV: {r}")
-
-    # ensure string columns
-    for c in REQUIRED_COLS:
-        _df[c] = _df[c].astype(str).str.strip()
-
-    # numeric conversion
-    for c in NUMERIC_COLS:
-        if c in _df.columns:
-            _df[c] = pd.to_numeric(_df[c], errors="coerce").fillna(0)
+    _df = None
+    cache_path = str(DATA_CACHE)
+    # the cache is only valid for this exact CSV (path, size, mtime) and this clean_csv
+    st = os.stat(csv_path)
+    stamp = {
+        b"clean_version": CLEAN_VERSION.encode(),
+        b"source_path": os.path.abspath(csv_path).encode(),
+        b"source_size": str(st.st_size).encode(),
+        b"source_mtime_ns": str(st.st_mtime_ns).encode(),
+    }
+    if os.path.exists(cache_path):
+        try:
+            print("Loading cleaned cache from:", cache_path)
+            # uncompressed Arrow IPC, memory-mapped: no parsing or decompression on startup
+            table = pa_feather.read_table(cache_path, memory_map=True)
+            meta = table.schema.metadata or {}
+            if all(meta.get(k) == v for k, v in stamp.items()):
+                _df = table.to_pandas()
+            else:
+                print("Feather cache does not match this CSV or clean_csv, rebuilding from CSV")
+        except Exception as e:
+            print("Feather cache read error:", e)
+            _df = None
+
+    if _df is None:
+        _df = clean_csv(csv_path)
+        try:
+            table = pa.Table.from_pandas(_df, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), **stamp})
+            # write beside the cache and swap it in: other workers may have the old file
+            # memory-mapped (rewriting it in place would SIGBUS them), and readers never
+            # see a half-written file
+            with tempfile.NamedTemporaryFile(dir=BASE_DIR, suffix=".feather.tmp", delete=False) as tmp:
+                tmp_path = tmp.name
+            try:
+                pa_feather.write_feather(table, tmp_path, compression="uncompressed")
+                os.replace(tmp_path, cache_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            print("Feather cache write skipped:", e)
 
     # dropdown lists
-    quarters = sorted([x for x in _df["Fiscal Quarter"].dropna().unique().tolist() if str(x).strip()])
-    all_months = [x for x in _df["Fiscal Month"].dropna().unique().tolist() if str(x).strip()]
-    months = sorted(all_months, key=lambda x: INDIAN_FINANCIAL_MONTHS.index(x) if x in INDIAN_FINANCIAL_MONTHS else 999)
-    locations = sorted([x for x in _df["Location"].dropna().unique().tolist() if str(x).strip()])
-    models = sorted([x for x in _df["Model Group"].dropna().unique().tolist() if str(x).strip()])
+    # categories are already unique, stripped and sorted (months in fiscal order);
+    # only the blank category needs dropping, no per-column unique()/sorted() pass
+    quarters = [x for x in _df["Fiscal Quarter"].cat.categories.tolist() if x]
+    months = [x for x in _df["Fiscal Month"].cat.categories.tolist() if x]
+    locations = [x for x in _df["Location"].cat.categories.tolist() if x]
+    models = [x for x in _df["Model Group"].cat.categories.tolist() if x]
 
     print("Rows loaded:", len(_df))
     return _df
 
 
+def build_key_index(_df: pd.DataFrame) -> pd.MultiIndex:
+    # sorted (quarter, month, location, model) key of every row, for binary-search lookups
+    if _df is None or _df.empty:
+        return pd.MultiIndex.from_arrays([[]] * len(REQUIRED_COLS), names=REQUIRED_COLS)
+    return pd.MultiIndex.from_frame(_df[REQUIRED_COLS])
+
+
 def compute_totals(_df: pd.DataFrame) -> Dict[str, Any]:
     totals: Dict[str, Any] = {}
     if _df is None or _df.empty:
@@ -164,38 +319,271 @@ def compute_totals(_df: pd.DataFrame) -> Dict[str, Any]:
         totals["No of Counter ROs"] = 0
         return totals
 
+    return totals_from_sums(_df[[c for c in NUMERIC_COLS if c in _df.columns]].sum())
+
+
+def totals_from_sums(sums: Mapping[str, float]) -> Dict[str, Any]:
+    totals: Dict[str, Any] = {}
     for c in NUMERIC_COLS:
-        totals[c] = float(_df[c].sum()) if c in _df.columns else 0.0
+        totals[c] = float(sums[c]) if c in sums else 0.0
 
-    totals["No of Billied Ros"] = int(_df["No of Billied Ros"].sum()) if "No of Billied Ros" in _df.columns else 0
-    totals["No of Counter ROs"] = int(_df["No of Counter ROs"].sum()) if "No of Counter ROs" in _df.columns else 0
+    totals["No of Billied Ros"] = int(sums["No of Billied Ros"]) if "No of Billied Ros" in sums else 0
+    totals["No of Counter ROs"] = int(sums["No of Counter ROs"]) if "No of Counter ROs" in sums else 0
     return totals
 
 
+def build_cube(_df: pd.DataFrame) -> pd.DataFrame:
+    # numeric sums per full (quarter, month, location, model) key, lexsorted by that key
+    if _df is None or _df.empty:
+        return pd.DataFrame(columns=NUMERIC_COLS, index=build_key_index(None))
+    cols = [c for c in NUMERIC_COLS if c in _df.columns]
+    return _df.groupby(REQUIRED_COLS, observed=True)[cols].sum()
+
+
+def build_numeric_array(_df: pd.DataFrame) -> np.ndarray:
+    # float64 copy of NUMERIC_COLS, column-major so each column is one contiguous run
+    # (built from the cube: totals are sums over cube rows, not raw rows)
+    if _df is None or _df.empty:
+        return np.empty((0, len(NUMERIC_COLS)))
+    return np.asfortranarray(_df.reindex(columns=NUMERIC_COLS, fill_value=0).to_numpy(dtype=np.float64))
+
+
+# numba totals kernel, set by load_numba_kernel only when the cube is large enough to use it
+_sum_rows_numba = None
+
+
+def load_numba_kernel() -> None:
+    # importing numba and loading the kernel costs about as much as the rest of startup,
+    # so it is only done for cubes of at least NUMBA_MIN_ROWS cells
+    global _sum_rows_numba
+    try:
+        import numba
+        from numba import njit, prange
+    except ImportError:  # optional: totals fall back to a NumPy gather + sum
+        return
+
+    # requests call the kernel from several anyio worker threads at once; the workqueue
+    # layer (used when neither TBB nor OpenMP is present) aborts on concurrent use
+    numba.config.THREADING_LAYER = "threadsafe"
+
+    @njit(parallel=True, cache=True)
+    def kernel(arr: np.ndarray, idx: np.ndarray) -> np.ndarray:
+        # one thread per column, so no two threads write the same output slot
+        out = np.zeros(arr.shape[1])
+        for j in prange(arr.shape[1]):
+            s = 0.0
+            for i in range(idx.shape[0]):
+                s += arr[idx[i], j]
+            out[j] = s
+        return out
+
+    # compile now, for the read-only position arrays filter_positions hands out
+    warm_idx = np.zeros(1, dtype=np.intp)
+    warm_idx.flags.writeable = False
+    try:
+        kernel(num_arr, warm_idx)
+    except Exception as e:  # no thread-safe layer available: stay on NumPy
+        print("Numba kernel unavailable:", e)
+        return
+    _sum_rows_numba = kernel
+
+
+def sum_rows(idx: Union[np.ndarray, slice]) -> np.ndarray:
+    # per-column sums of num_arr over the given cube row positions (a slice sums a view, no gather)
+    if isinstance(idx, slice):
+        return num_arr[idx].sum(axis=0)
+    if _sum_rows_numba is not None and len(idx) >= NUMBA_MIN_ROWS:
+        return _sum_rows_numba(num_arr, idx)
+    return num_arr[idx].sum(axis=0)
+
+
 # Load once at startup
 try:
     df = load_csv()
 except Exception as e:
     print("CSV load error:", e)
     df = pd.DataFrame()
+key_index = build_key_index(df)
+total_all = compute_totals(df)
+cube = build_cube(df)
+num_arr = build_numeric_array(cube)
+# dropdowns only change with the CSV, so serialize them once
+filter_options_json = orjson.dumps({"quarters": quarters, "months": months, "locations": locations, "models": models})
+if len(num_arr) >= NUMBA_MIN_ROWS:
+    load_numba_kernel()
 
 
-# Cache filtering for speed
+def filter_key(q: str, m: str, l: str, md: str) -> List[Any]:
+    return [v if v else slice(None) for v in (q, m, l, md)]
+
+
+def compact(idx: np.ndarray) -> Union[np.ndarray, slice]:
+    # sorted positions without gaps are a plain range: a slice lets callers take a view
+    # instead of a gather; anything else stays read-only, as results are cached and shared
+    if len(idx) and idx[-1] - idx[0] + 1 == len(idx):
+        return slice(int(idx[0]), int(idx[-1]) + 1)
+    idx.flags.writeable = False
+    return idx
+
+
+def locate(index: pd.MultiIndex, key: List[Any]) -> Union[np.ndarray, slice]:
+    # positions matching key in a lexsorted MultiIndex
+    try:
+        idx = np.asarray(index.get_locs(key), dtype=np.intp)
+    except KeyError:
+        idx = np.empty(0, dtype=np.intp)
+    return compact(idx)
+
+
+def is_prefix(q: str, m: str, l: str, md: str) -> bool:
+    # set filters form a leading run of REQUIRED_COLS, e.g. quarter, or quarter + month
+    vals = (q, m, l, md)
+    n = sum(1 for v in vals if v)
+    return n > 0 and all(vals[:n])
+
+
+def locate_prefix(index: pd.MultiIndex, key: Tuple[str, ...]) -> slice:
+    # key covers the leading levels of a lexsorted index, so the matches are one contiguous
+    # run: narrow it level by level with two searchsorted calls on the int codes
+    start, stop = 0, len(index)
+    for lvl, v in enumerate(key):
+        code = index.levels[lvl].get_indexer([v])[0]
+        if code < 0:
+            return slice(0, 0)
+        codes = index.codes[lvl][start:stop]
+        start, stop = start + codes.searchsorted(code, "left"), start + codes.searchsorted(code, "right")
+    return slice(int(start), int(stop))
+
+
+# Cache filtering for speed: only the matching row positions are kept
+# (small int arrays), never whole DataFrame copies
 @lru_cache(maxsize=512)
-def cached_filter(q: str, m: str, l: str, md: str) -> pd.DataFrame:
+def filter_positions(q: str, m: str, l: str, md: str) -> Union[np.ndarray, slice, None]:
+    # row positions matching the filters (a slice when they are contiguous); None means no filter is set
+    if not (q or m or l or md):
+        return None
+
+    # rows are sorted by REQUIRED_COLS: a leading run of filters (including all four)
+    # is one row range, anything else is a binary search per level
+    if is_prefix(q, m, l, md):
+        return locate_prefix(key_index, tuple(v for v in (q, m, l, md) if v))
+    return locate(key_index, filter_key(q, m, l, md))
+
+
+def filter_frame(q: str, m: str, l: str, md: str) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame()
 
-    f = df
-    if q:
-        f = f[f["Fiscal Quarter"] == q]
-    if m:
-        f = f[f["Fiscal Month"] == m]
-    if l:
-        f = f[f["Location"] == l]
-    if md:
-        f = f[f["Model Group"] == md]
-    return f
+    idx = filter_positions(q, m, l, md)
+    if idx is None:
+        return df
+    # a slice is a view of df, positions need a gather
+    return df.iloc[idx] if isinstance(idx, slice) else df.take(idx)
+
+
+@lru_cache(maxsize=512)
+def cached_totals(q: str, m: str, l: str, md: str) -> Dict[str, Any]:
+    if not (q or m or l or md):
+        return total_all
+    # sum the matching cube cells; the cube is at most as long as the data
+    if is_prefix(q, m, l, md):
+        idx = locate_prefix(cube.index, tuple(v for v in (q, m, l, md) if v))
+    else:
+        idx = locate(cube.index, filter_key(q, m, l, md))
+    return totals_from_sums(dict(zip(NUMERIC_COLS, sum_rows(idx))))
+
+
+# Cache the projected rows too, so repeat filters skip serialization prep.
+# Rows are positional (see TABLE_COLS); each column goes through one bulk tolist().
+@lru_cache(maxsize=512)
+def cached_rows(q: str, m: str, l: str, md: str) -> Tuple[Tuple[tuple, ...], Dict[str, Any], int]:
+    f = filter_frame(q, m, l, md)
+    totals = cached_totals(q, m, l, md)
+    if f.empty:
+        return (), totals, 0
+
+    rows = tuple(zip(*(f[c].tolist() for c in TABLE_COLS)))
+    return rows, totals, int(len(f))
+
+
+def warm_caches() -> None:
+    # a fresh worker otherwise pays for each common filter on its first request:
+    # prefill the unfiltered rows and the positions/totals of every single-dropdown filter
+    if df.empty:
+        return
+    keys = [("", "", "", "")]
+    for i, values in enumerate((quarters, months, locations, models)):
+        for v in values:
+            key = ["", "", "", ""]
+            key[i] = v
+            keys.append(tuple(key))
+    # leave room for what users actually ask for
+    if len(keys) >= filter_positions.cache_info().maxsize // 2:
+        keys = keys[:1]
+
+    cached_rows(*keys[0])
+    for key in keys:
+        filter_positions(*key)
+        cached_totals(*key)
+
+
+warm_caches()
+
+
+def build_xlsx(q: str, m: str, l: str, md: str) -> tempfile.SpooledTemporaryFile:
+    # reuse the rows/totals already built for get_data; no projected copy of the frame
+    rows, totals, count = cached_rows(q, m, l, md)
+
+    totals_row = ["TOTAL"] + [""] * (len(TABLE_COLS) - 1)
+    for j in NUMERIC_COL_IDX:
+        totals_row[j] = totals.get(TABLE_COLS[j], 0)
+
+    # small exports stay in memory, large ones go to disk instead of a second full copy in RAM;
+    # constant_memory flushes each row as soon as the next one starts
+    output = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_BYTES)
+    wb = xlsxwriter.Workbook(output, {"constant_memory": True})
+    ws = wb.add_worksheet("Sales Data")
+    header_fmt = wb.add_format(HEADER_FORMAT)
+    data_fmt = wb.add_format(DATA_FORMAT)
+    totals_fmt = wb.add_format(TOTALS_FORMAT)
+    totals_num_fmt = wb.add_format(TOTALS_NUMERIC_FORMAT)
+
+    # single pass: header, data and totals rows, tracking column widths as they go
+    widths = [len(c) for c in TABLE_COLS]
+    ws.write_row(0, 0, TABLE_COLS, header_fmt)
+    for i, row in enumerate(rows, start=1):
+        ws.write_row(i, 0, row, data_fmt)
+        for j, v in enumerate(row):
+            n = len(str(v))
+            if n > widths[j]:
+                widths[j] = n
+    for j, v in enumerate(totals_row):
+        ws.write(count + 1, j, v, totals_num_fmt if j in NUMERIC_COL_IDX else totals_fmt)
+        widths[j] = max(widths[j], len(str(v)))
+
+    # auto width (column info is only serialized on close, so this can come last)
+    for j, w in enumerate(widths):
+        ws.set_column(j, j, min(w + 2, 50))
+
+    wb.close()
+    return output
+
+
+async def iter_file(f, chunk_size: int = 64 * 1024):
+    # chunked reads (off the loop, the file may be on disk); the file is closed once sent
+    try:
+        f.seek(0)
+        while chunk := await anyio.to_thread.run_sync(f.read, chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
+
+async def iter_csv(f: pd.DataFrame):
+    yield ",".join(TABLE_COLS) + "\n"
+    for start in range(0, len(f), CSV_CHUNK_ROWS):
+        chunk = f.iloc[start:start + CSV_CHUNK_ROWS]
+        yield await anyio.to_thread.run_sync(partial(chunk.to_csv, columns=TABLE_COLS, index=False, header=False))
 
 
 # -------------------- ROUTES --------------------
@@ -208,40 +596,31 @@ def root():
 
 
 @app.get("/api/filter-options")
-def filter_options():
-    return {
-        "quarters": quarters,
-        "months": months,
-        "locations": locations,
-        "models": models,
-    }
+async def filter_options():
+    return Response(
+        content=filter_options_json,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=300"},
+    )
 
 
-@app.post("/api/get-data")
-def get_data(req: FilterRequest):
+@app.post("/api/get-data", openapi_extra=FILTER_REQUEST_OPENAPI)
+async def get_data(req: FilterRequest = Depends(filter_request)):
     if df.empty:
-        return {"data": [], "totals": compute_totals(pd.DataFrame()), "count": 0}
+        return ORJSONResponse({"columns": TABLE_COLS, "rows": [], "totals": compute_totals(pd.DataFrame()), "count": 0})
 
     q = (req.quarter or "").strip()
     m = (req.month or "").strip()
     l = (req.location or "").strip()
     md = (req.model or "").strip()
 
-    f = cached_filter(q, m, l, md)
-    totals = compute_totals(f)
-
-    # send only required columns for faster response
-    if not f.empty:
-        f2 = f[TABLE_COLS].copy()
-        data = f2.to_dict("records")
-    else:
-        data = []
-
-    return {"data": data, "totals": totals, "count": int(len(f))}
+    # only the pandas work goes to a worker thread; encoding stays on the loop
+    rows, totals, count = await anyio.to_thread.run_sync(cached_rows, q, m, l, md)
+    return ORJSONResponse({"columns": TABLE_COLS, "rows": rows, "totals": totals, "count": count})
 
 
-@app.post("/api/export-excel")
-def export_excel(req: FilterRequest):
+@app.post("/api/export-excel", openapi_extra=FILTER_REQUEST_OPENAPI)
+async def export_excel(req: FilterRequest = Depends(filter_request)):
     if df.empty:
         raise HTTPException(status_code=400, detail="No data loaded")
 
@@ -250,72 +629,41 @@ def export_excel(req: FilterRequest):
     l = (req.location or "").strip()
     md = (req.model or "").strip()
 
-    f = cached_filter(q, m, l, md)
-    f_export = f[TABLE_COLS].copy() if not f.empty else pd.DataFrame(columns=TABLE_COLS)
-    totals = compute_totals(f)
-
-    output = BytesIO()
+    # build off the event loop; the xlsx zip has to be finished before sending
     try:
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            f_export.to_excel(writer, sheet_name="Sales Data", index=False)
-            ws = writer.sheets["Sales Data"]
-
-            # add totals row
-            totals_row = {c: "" for c in TABLE_COLS}
-            totals_row["Fiscal Quarter"] = "TOTAL"
-            for c in NUMERIC_COLS:
-                if c in totals_row:
-                    totals_row[c] = totals.get(c, 0)
-
-            start_row = len(f_export) + 2
-            pd.DataFrame([totals_row]).to_excel(
-                writer, sheet_name="Sales Data", startrow=start_row - 1, index=False, header=False
-            )
-
-            thin = Side(style="thin", color="D1D5DB")
-            border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-            # header format
-            for cell in ws[1]:
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.border = border
-
-            # cell borders
-            for row in ws.iter_rows(min_row=2, max_row=len(f_export) + 1):
-                for cell in row:
-                    cell.border = border
-
-            # totals row format
-            totals_excel_row = len(f_export) + 2
-            for cell in ws[totals_excel_row]:
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="E0E7FF", end_color="E0E7FF", fill_type="solid")
-                cell.border = border
-
-            # auto width
-            for col_cells in ws.columns:
-                col_letter = col_cells[0].column_letter
-                max_len = 0
-                for c in col_cells:
-                    v = "" if c.value is None else str(c.value)
-                    max_len = max(max_len, len(v))
-                ws.column_dimensions[col_letter].width = min(max_len + 2, 50)
-
-        output.seek(0)
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=accessories_sales_filtered.xlsx"},
-        )
-
+        output = await anyio.to_thread.run_sync(build_xlsx, q, m, l, md)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
+    size = output.seek(0, os.SEEK_END)
+    return StreamingResponse(
+        iter_file(output),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": "attachment; filename=accessories_sales_filtered.xlsx",
+            "Content-Length": str(size),
+        },
+    )
+
+
+@app.post("/api/export-csv", openapi_extra=FILTER_REQUEST_OPENAPI)
+async def export_csv(req: FilterRequest = Depends(filter_request)):
+    if df.empty:
+        raise HTTPException(status_code=400, detail="No data loaded")
+
+    q = (req.quarter or "").strip()
+    m = (req.month or "").strip()
+    l = (req.location or "").strip()
+    md = (req.model or "").strip()
+
+    f = await anyio.to_thread.run_sync(filter_frame, q, m, l, md)
+    return StreamingResponse(
+        iter_csv(f),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=accessories_sales_filtered.csv"},
+    )
+
 
 @app.get("/api/health")
-def health():
+async def health():
     return {"status": "ok", "timestamp": datetime.now().isoformat()}